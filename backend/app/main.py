@@ -5,6 +5,8 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from core.pdf_processor import PDFProcessor
 from db.session import SessionLocal, init_db
 from db.models import Document
+from app.utils import service_memory_report
+from app.router import router as qa_router
 import os
 import logging
 
@@ -36,6 +38,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# RAG indexing (/index) and question answering (/query)
+app.include_router(qa_router)
+
 # Database initialization with retries
 @app.on_event("startup")
 async def startup_event():
@@ -65,7 +70,9 @@ async def upload_pdf(
             "status": "success",
             "document_id": str(result["id"]),
             "saved_to": result["path"],
-            "text_extracted": len(result["text"]) > 0
+            "text_extracted": len(result["text"]) > 0,
+            "duplicate_of": str(result["duplicate_of"]) if result.get("duplicate_of") else None,
+            "changed_pages": result.get("changed_pages", [])
         })
     except Exception as e:
         raise HTTPException(
@@ -81,10 +88,22 @@ async def health_check():
         "endpoints": {
             "upload_form": "/upload-form",
             "list_documents": "/documents",
-            "upload_api": "/upload"
+            "upload_api": "/upload",
+            "index_api": "/index",
+            "query_api": "/query",
+            "memory": "/memory"
         }
     }
 
+@app.get("/memory")
+async def worker_memory():
+    """Memory report for the gunicorn master and all workers.
+
+    Models and the index are shared copy-on-write; a worker that reloaded
+    the index on its own shows it in private_dirty_mb.
+    """
+    return service_memory_report()
+
 # Mount static directories
 app.mount("/faiss_index", StaticFiles(directory="data/faiss_index"), name="faiss_index")
 
@@ -1,29 +1,154 @@
 # backend/app/qa_engine.py for Metadata-aware QA
+import fcntl
+import logging
+import os
+import pickle
+import signal
+import threading
+from functools import lru_cache
+
+import faiss
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import HuggingFacePipeline
 from langchain.chains import RetrievalQA
 from transformers import pipeline
+from core.embedding_service import get_embedding_service
 
-def load_vectorstore():
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    return FAISS.load_local("vector_store", embeddings, allow_dangerous_deserialization=True)
+logger = logging.getLogger(__name__)
 
-def get_qa_chain(source_filter=None):
-    vectorstore = load_vectorstore()
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "vector_store")
+VECTOR_STORE_INDEX = os.path.join(VECTOR_STORE_PATH, "index.faiss")
+VECTOR_STORE_DOCSTORE = os.path.join(VECTOR_STORE_PATH, "index.pkl")
+# Held exclusively while the index files are rewritten, shared while they are read
+VECTOR_STORE_LOCK = os.path.join(VECTOR_STORE_PATH, ".lock")
 
-    if source_filter:
-        retriever = vectorstore.as_retriever(search_kwargs={"filter": {"source": source_filter}})
-    else:
-        retriever = vectorstore.as_retriever()
+# Models and index are loaded once per process and cached. When the app is
+# preloaded in the gunicorn master (see gunicorn_conf.py), workers inherit
+# these objects through fork and share their memory copy-on-write instead
+# of loading copies.
+#
+# The index can't be memory-mapped (faiss only mmaps IVF inverted lists,
+# not the IndexFlat written here, and the docstore is an unpickled heap
+# object), so a worker that reloads it holds a private copy. To keep it
+# shared, every index update sends SIGHUP to the gunicorn master, which
+# reloads the index (see on_reload in gunicorn_conf.py) and replaces the
+# workers with fresh forks. Set RELOAD_WORKERS_ON_INDEX_UPDATE=0 to skip
+# that; workers then reload privately on their next query (one private
+# copy each, plus the master's stale one, until they restart).
+
+_vectorstore = None
+_vectorstore_version = None
+_vectorstore_lock = threading.Lock()
 
+@lru_cache(maxsize=1)
+def get_llm():
     hf_pipeline = pipeline(
         "text2text-generation",
         model="google/flan-t5-base",
         max_length=512,
         temperature=0.1
     )
+    hf_pipeline.model.eval()
+    return HuggingFacePipeline(pipeline=hf_pipeline)
+
+def _vectorstore_version_on_disk():
+    return tuple(os.stat(path).st_mtime_ns for path in (VECTOR_STORE_INDEX, VECTOR_STORE_DOCSTORE))
+
+def load_vectorstore():
+    """Return the cached vector store, reloading it when the files on disk change.
+
+    Uploads handled by any worker rewrite the index files, so comparing
+    mtimes keeps every worker serving the current index.
+    """
+    global _vectorstore, _vectorstore_version
+    with _vectorstore_lock:
+        if _vectorstore is not None and _vectorstore_version == _vectorstore_version_on_disk():
+            return _vectorstore
+        with open(VECTOR_STORE_LOCK, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            version = _vectorstore_version_on_disk()
+            index = faiss.read_index(VECTOR_STORE_INDEX)
+            with open(VECTOR_STORE_DOCSTORE, "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+        _vectorstore = FAISS(get_embedding_service(), index, docstore, index_to_docstore_id)
+        _vectorstore_version = version
+        return _vectorstore
+
+def update_vectorstore(new_chunks, document_id, source, supersedes=None, page_map=None):
+    """Merge a document's new chunks into the index on disk.
 
-    llm = HuggingFacePipeline(pipeline=hf_pipeline)
+    Chunks carry 'document_id', 'source' and 'page' metadata. When the
+    document is a near-duplicate, it supersedes the original in the index:
+    the original's chunks for unchanged pages (page_map: original page ->
+    new page) are relabelled to the new document and source without being
+    re-embedded, and its chunks for replaced or dropped pages are deleted.
+    Queries filtered on the new source then see the full new version, and
+    no stale text from the old version is left behind.
+
+    Holds the exclusive lock so concurrent uploads from any worker don't
+    overwrite each other, then asks gunicorn to re-fork the workers.
+    """
+    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
+    with open(VECTOR_STORE_LOCK, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stored = None
+        if os.path.exists(VECTOR_STORE_INDEX):
+            stored = FAISS.load_local(VECTOR_STORE_PATH, get_embedding_service(), allow_dangerous_deserialization=True)
+
+        if stored is not None and supersedes:
+            page_map = page_map or {}
+            stale = []
+            for chunk_id in list(stored.index_to_docstore_id.values()):
+                chunk = stored.docstore.search(chunk_id)
+                if chunk.metadata.get("document_id") != str(supersedes):
+                    continue
+                page = chunk.metadata.get("page")
+                if page in page_map:
+                    chunk.metadata.update(document_id=str(document_id), source=source, page=page_map[page])
+                else:
+                    stale.append(chunk_id)
+            if stale:
+                stored.delete(stale)
+
+        if new_chunks is not None:
+            if stored is None:
+                stored = new_chunks
+            else:
+                stored.merge_from(new_chunks)
+        if stored is not None:
+            stored.save_local(VECTOR_STORE_PATH)
+    reload_workers()
+
+def reload_workers():
+    """Ask the gunicorn master to reload the index and re-fork its workers"""
+    master = os.getenv("GUNICORN_MASTER_PID")
+    if master and os.getenv("RELOAD_WORKERS_ON_INDEX_UPDATE", "1") == "1":
+        os.kill(int(master), signal.SIGHUP)
+
+def preload():
+    """Load models and index up front, before workers are forked"""
+    get_embedding_service()
+    get_llm()
+    preload_index()
+
+def preload_index():
+    """Load the index if it exists; a missing or bad index must not stop the server"""
+    if os.getenv("PRELOAD_INDEX", "1") != "1":
+        return
+    if not os.path.exists(VECTOR_STORE_INDEX):
+        logger.warning(f"No vector index at {VECTOR_STORE_PATH}, skipping index preload")
+        return
+    try:
+        load_vectorstore()
+    except Exception as e:
+        logger.warning(f"Could not preload vector index: {str(e)}")
+
+def get_qa_chain(source_filter=None):
+    vectorstore = load_vectorstore()
+
+    if source_filter:
+        retriever = vectorstore.as_retriever(search_kwargs={"filter": {"source": source_filter}})
+    else:
+        retriever = vectorstore.as_retriever()
 
-    return RetrievalQA.from_chain_type(llm=llm, retriever=retriever)
+    return RetrievalQA.from_chain_type(llm=get_llm(), retriever=retriever)
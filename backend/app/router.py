@@ -2,56 +2,107 @@
 
 from fastapi import APIRouter, UploadFile, File
 import os
+import uuid
 
-from langchain_community.document_loaders import PyPDFLoader
 #from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document as LangchainDocument
 from pydantic import BaseModel
-from app.qa_engine import get_qa_chain
+from app.qa_engine import get_qa_chain, update_vectorstore
 from app.feedback_log import log_feedback
+from core import dedup
+from core.embedding_service import get_embedding_service
+from core.pdf_processor import PDFProcessor, DuplicateDocumentError
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/data")
 
 router = APIRouter()
+pdf_processor = PDFProcessor()
 
-@router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
-    contents = await file.read()
-    
-    temp_pdf_path = f"/app/data/{file.filename}"
-    with open(temp_pdf_path, "wb") as f:
-        f.write(contents)
+@router.post("/index")
+def upload_pdf(file: UploadFile = File(...)):
+    # Sync handler: parsing, hashing and embedding run in FastAPI's threadpool
+    contents = file.file.read()
 
-    # Load PDF
-    loader = PyPDFLoader(temp_pdf_path)
-    documents = loader.load()
+    # Exact duplicate already in the index: nothing to parse or embed.
+    # Rows stored by the main /upload (PDFProcessor) aren't indexed yet, so
+    # such a row is reused and indexed below instead of being skipped.
+    content_hash = dedup.content_hash(contents)
+    record = pdf_processor.find_exact_duplicate(content_hash)
+    if record and record.indexed:
+        return {"message": f"{file.filename} is already indexed.", "duplicate_of": str(record.id)}
 
-    # Split text
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = text_splitter.split_documents(documents)
+    created = record is None
+    if created:
+        # Unique path so re-issued versions with the same filename don't overwrite each other
+        file_ext = os.path.splitext(file.filename)[1]
+        pdf_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{file_ext}")
+        with open(pdf_path, "wb") as f:
+            f.write(contents)
+    else:
+        pdf_path = record.file_path
 
-    # Embed using HuggingFace
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    # Same extractor as PDFProcessor, so page hashes match across both paths
+    pages = pdf_processor.extract_pages(pdf_path)
+    fingerprint = pdf_processor.fingerprint_pages(pages, indexed_only=True)
 
-    # Extract text and metadata for FAISS
-    texts = [doc.page_content for doc in docs]
-    metadatas = [doc.metadata for doc in docs]
+    if created:
+        try:
+            record = pdf_processor.save_document(
+                title=file.filename,
+                doc_type="upload",
+                file_path=pdf_path,
+                content_hash=content_hash,
+                fingerprint=fingerprint
+            )
+        except DuplicateDocumentError as e:
+            os.remove(pdf_path)
+            return {"message": f"{file.filename} is already being indexed.", "duplicate_of": str(e.document.id)}
 
-    from langchain_community.vectorstores import FAISS
-    vectorstore = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
+    try:
+        # Near duplicate: only embed pages the original doesn't already have;
+        # its unchanged chunks are relabelled by update_vectorstore
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        docs = text_splitter.split_documents([
+            LangchainDocument(
+                page_content=pages[i],
+                metadata={"source": file.filename, "page": i, "document_id": str(record.id)}
+            )
+            for i in fingerprint["changed_pages"]
+        ])
 
-    # Save to local disk
-    vectorstore.save_local("/app/vector_store")
+        # Embed using the shared embedding service
+        new_chunks = FAISS.from_documents(docs, get_embedding_service()) if docs else None
+        update_vectorstore(
+            new_chunks,
+            document_id=record.id,
+            source=file.filename,
+            supersedes=fingerprint["duplicate_of"],
+            page_map=fingerprint["page_map"]
+        )
+        pdf_processor.mark_indexed(record.id, duplicate_of=fingerprint["duplicate_of"])
+    except Exception:
+        # Don't leave a new record that would make a retry look like a duplicate
+        if created:
+            pdf_processor.delete_document(record.id)
+        raise
 
-    return {"message": f"{file.filename} processed and stored."}
+    return {
+        "message": f"{file.filename} processed and stored.",
+        "document_id": str(record.id),
+        "duplicate_of": str(fingerprint["duplicate_of"]) if fingerprint["duplicate_of"] else None,
+        "embedded_pages": fingerprint["changed_pages"]
+    }
 
 class QueryRequest(BaseModel):
     question: str
     source: str | None = None
 
 @router.post("/query")
-async def query_pdf(request: QueryRequest):
+def query_pdf(request: QueryRequest):
+    # Sync handler so concurrent queries run in the threadpool and their
+    # embeddings can be batched together by the embedding service
     chain = get_qa_chain(request.source)
     answer = chain.run(request.question)
 
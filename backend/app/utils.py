@@ -0,0 +1,65 @@
+# backend/app/utils.py
+import os
+import resource
+
+_SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+def memory_report(pid="self") -> dict:
+    """Memory usage of one process (the current one by default).
+
+    PSS splits shared pages evenly between the processes mapping them, so
+    summing pss_mb across processes gives the real footprint of the service.
+    """
+    report = {"pid": os.getpid() if pid == "self" else int(pid)}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    report[_SMAPS_FIELDS[key]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        if pid == "self":
+            # Not Linux (or no smaps_rollup): fall back to peak RSS only
+            report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        else:
+            report["error"] = "unavailable"
+    return report
+
+def _child_pids(parent: int) -> list:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after "(comm)": state, ppid, ...
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            pids.append(int(entry))
+    return sorted(pids)
+
+def service_memory_report() -> dict:
+    """Memory usage of the gunicorn master and every worker.
+
+    Falls back to the current process when not running under gunicorn.
+    """
+    master = os.getenv("GUNICORN_MASTER_PID")
+    if not master:
+        report = {"master": None, "workers": [memory_report()]}
+    else:
+        report = {
+            "master": memory_report(master),
+            "workers": [memory_report(pid) for pid in _child_pids(int(master))],
+        }
+    processes = [p for p in [report["master"]] + report["workers"] if p]
+    report["total_pss_mb"] = round(sum(p.get("pss_mb", 0) for p in processes), 1)
+    return report
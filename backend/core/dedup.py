@@ -0,0 +1,97 @@
+import hashlib
+import re
+import struct
+from typing import Dict, Iterable, List, Sequence
+
+# MinHash / LSH parameters. 32 bands of 4 rows puts the LSH "knee" at a
+# Jaccard similarity of roughly (1/32) ** (1/4) ~= 0.42, so candidates are
+# generous and the final decision is made by NEAR_DUPLICATE_THRESHOLD.
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _seeded_params(num_perm: int):
+    """Deterministic (a, b) pairs so signatures are stable across processes"""
+    params = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"minhash-{i}".encode()).digest()
+        a, b = struct.unpack("<QQ", digest[:16])
+        params.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+    return params
+
+
+_PERMUTATIONS = _seeded_params(NUM_PERM)
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of the raw upload, used for exact duplicate detection"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so layout noise doesn't change hashes"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def page_hashes(pages: Sequence[str]) -> List[str]:
+    """Hash each page's normalized text to find which pages changed"""
+    return [hashlib.sha256(normalize_text(p).encode()).hexdigest() for p in pages]
+
+
+def _shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    words = normalize_text(text).split(" ")
+    if len(words) < k:
+        return {" ".join(words)} if words != [""] else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _hash32(shingle: str) -> int:
+    return struct.unpack("<I", hashlib.blake2b(shingle.encode(), digest_size=4).digest())[0]
+
+
+def minhash_signature(text: str) -> List[int]:
+    """Compute a NUM_PERM-long MinHash signature over word shingles"""
+    hashes = [_hash32(s) for s in _shingles(text)]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def lsh_buckets(signature: Sequence[int]) -> List[str]:
+    """Split a signature into LSH_BANDS band buckets (one key per band)"""
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        packed = struct.pack(f"<{LSH_ROWS}I", *rows)
+        buckets.append(hashlib.md5(packed).hexdigest())
+    return buckets
+
+
+def estimate_jaccard(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """Fraction of matching MinHash slots, an estimate of Jaccard similarity"""
+    if len(sig_a) != len(sig_b) or not sig_a:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def changed_pages(new_hashes: Sequence[str], existing_hashes: Iterable[str]) -> List[int]:
+    """Indexes of pages in the new upload whose content isn't in the existing document"""
+    known = set(existing_hashes or [])
+    return [i for i, h in enumerate(new_hashes) if h not in known]
+
+
+def matched_pages(new_hashes: Sequence[str], existing_hashes: Iterable[str]) -> Dict[int, int]:
+    """Map each existing page index to the index of the identical page in the new upload"""
+    new_index = {}
+    for i, h in enumerate(new_hashes):
+        new_index.setdefault(h, i)
+    return {j: new_index[h] for j, h in enumerate(existing_hashes or []) if h in new_index}
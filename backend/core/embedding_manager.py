@@ -1,13 +1,11 @@
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
+from core.embedding_service import get_embedding_service
 
 class EmbeddingManager:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2"
-        )
+        self.embeddings = get_embedding_service()
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=512,
             chunk_overlap=50
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "float")  # "float" or "int8"
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+PARITY_MIN_COSINE = 0.99
+
+_PARITY_SENTENCES = [
+    "Banks must hold a stock of high-quality liquid assets to cover net cash outflows over 30 days.",
+    "The net stable funding ratio requires available stable funding to exceed required stable funding.",
+    "Internal policy sets limits on intraday liquidity exposure for each business line.",
+    "Level 2A assets are subject to a 15% haircut and a 40% cap in the liquidity buffer.",
+]
+
+
+class EmbeddingService(Embeddings):
+    """Shared in-process embedding service.
+
+    Concurrent embed calls are coalesced into micro-batches by a single
+    background thread. Query texts go in their own queue and are always
+    served before bulk (ingestion) texts, and bulk batches are capped at
+    max_batch so a query waits for at most one bulk forward pass. Callers
+    only overlap if they don't block the event loop: use the sync methods
+    from sync (threadpool) handlers, or the async ones from async code.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+                 max_batch: int = EMBEDDING_MAX_BATCH, max_wait_ms: float = EMBEDDING_MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        if backend not in ("float", "int8"):
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.backend = backend
+        self.parity = None
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.eval()
+        self._backend_ready = False
+
+        self._queries = deque()
+        self._bulk = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+    def _prepare_backend(self):
+        """Swap in the int8 model if its output matches the float model.
+
+        Runs in the batching thread, i.e. after fork: running torch in the
+        gunicorn master would start its OpenMP pool, which isn't fork-safe.
+        """
+        quantized = self._quantize(self.model)
+        self.parity = self._parity_check(self.model, quantized)
+        if self.parity >= PARITY_MIN_COSINE:
+            logger.info(f"Using int8 embedding backend (min cosine vs float: {self.parity:.4f})")
+            self.model = quantized
+        else:
+            logger.warning(
+                f"int8 embeddings diverge from float (min cosine {self.parity:.4f} < "
+                f"{PARITY_MIN_COSINE}), falling back to float backend"
+            )
+            self.backend = "float"
+
+    @staticmethod
+    def _quantize(model: SentenceTransformer) -> SentenceTransformer:
+        """Dynamic int8 quantization of the Linear layers for CPU inference"""
+        import torch
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    @staticmethod
+    def _parity_check(reference: SentenceTransformer, candidate: SentenceTransformer) -> float:
+        """Minimum cosine similarity between reference and candidate embeddings"""
+        a = reference.encode(_PARITY_SENTENCES, convert_to_numpy=True, normalize_embeddings=True)
+        b = candidate.encode(_PARITY_SENTENCES, convert_to_numpy=True, normalize_embeddings=True)
+        return float((a * b).sum(axis=1).min())
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit([text], self._queries)[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._submit(texts, self._bulk)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._asubmit([text], self._queries))[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._asubmit(texts, self._bulk)
+
+    def _submit(self, texts: List[str], queue: deque) -> List[List[float]]:
+        return [f.result() for f in self._enqueue(texts, queue)]
+
+    async def _asubmit(self, texts: List[str], queue: deque) -> List[List[float]]:
+        futures = self._enqueue(texts, queue)
+        return list(await asyncio.gather(*[asyncio.wrap_future(f) for f in futures]))
+
+    def _enqueue(self, texts: List[str], queue: deque) -> List[Future]:
+        self._ensure_worker()
+        futures = [Future() for _ in texts]
+        with self._cond:
+            queue.extend(zip(texts, futures))
+            self._cond.notify()
+        return futures
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._cond:
+            if self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queries and not self._bulk:
+                self._cond.wait()
+            if self._queries:
+                # Give concurrent queries a short window to coalesce
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queries) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                queue = self._queries
+            else:
+                # Bulk texts arrive together, so no need to wait for more
+                queue = self._bulk
+            batch = []
+            while queue and len(batch) < self.max_batch:
+                text, future = queue.popleft()
+                # Drop texts whose caller went away (e.g. a cancelled aembed_*);
+                # once running, a future can no longer be cancelled
+                if future.set_running_or_notify_cancel():
+                    batch.append((text, future))
+            return batch
+
+    def _run(self):
+        if self.backend == "int8" and not self._backend_ready:
+            try:
+                self._prepare_backend()
+            except Exception as e:
+                logger.error(f"int8 embedding backend failed, using float: {str(e)}", exc_info=True)
+                self.backend = "float"
+        self._backend_ready = True
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            # Nothing may escape this loop: a dead thread leaves every
+            # pending caller blocked forever
+            try:
+                texts = [text.replace("\n", " ") for text, _ in batch]
+                vectors = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector.tolist())
+            except Exception as e:
+                logger.error(f"Embedding batch failed: {str(e)}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    """Process-wide embedding service shared by QA, upload and indexing"""
+    return EmbeddingService()
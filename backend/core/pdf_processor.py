@@ -1,19 +1,27 @@
 import os
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 from fastapi import UploadFile, HTTPException
-from PyPDF2 import PdfReader, PdfException
-from db.models import Document
+from fastapi.concurrency import run_in_threadpool
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PyPdfError
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from db.models import Document, DocumentMinHashBand
 from db.session import SessionLocal
+from core import dedup
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
-class PDFProcessor:
-    def __init__(self):
-        self.db = SessionLocal()
+class DuplicateDocumentError(Exception):
+    """Raised when a document with the same content hash is already stored"""
+    def __init__(self, document: Document):
+        super().__init__(f"Duplicate of document {document.id}")
+        self.document = document
 
+class PDFProcessor:
     async def process_pdf(self, file: UploadFile, doc_type: str) -> Dict:
         """
         Process uploaded PDF with comprehensive error handling
@@ -21,7 +29,13 @@ class PDFProcessor:
             file: FastAPI UploadFile object
             doc_type: 'policy' or 'regulation'
         Returns:
-            dict: {'id': str, 'text': str, 'path': str}
+            dict: {'id': str, 'text': str, 'path': str,
+                   'duplicate_of': str | None, 'changed_pages': list[int]}
+
+        Exact duplicates (same file bytes) are short-circuited and return the
+        existing document. Near-duplicates (MinHash similarity above
+        dedup.NEAR_DUPLICATE_THRESHOLD) are stored, linked to the original and
+        report only the pages that changed.
         Raises:
             HTTPException: For validation or processing errors
         """
@@ -29,96 +43,225 @@ class PDFProcessor:
             # Validate inputs
             if doc_type not in ["policy", "regulation"]:
                 raise ValueError("Document type must be 'policy' or 'regulation'")
-            
+
             if not file.filename.lower().endswith('.pdf'):
                 raise ValueError("Only PDF files are allowed")
 
-            # Create target directory
-            target_dir = f"data/{doc_type}s/"
-            os.makedirs(target_dir, exist_ok=True)
-
-            # Generate unique filename
-            file_ext = os.path.splitext(file.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_ext}"
-            file_path = os.path.join(target_dir, unique_filename)
-
-            # Save file
             file_content = await file.read()
             if not file_content:
                 raise ValueError("Uploaded file is empty")
-            
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-
-            # Extract text
-            text = self._extract_text(file_path)
-            
-            # Save to database
-            doc = self._save_to_db(
-                filename=unique_filename,
-                doc_type=doc_type,
-                file_path=file_path,
-                text=text
-            )
-            
-            return {
-                "id": doc.id,
-                "text": text,
-                "path": file_path
-            }
-            
+
+            # Parsing, hashing and DB access block, keep them off the event loop
+            return await run_in_threadpool(self._process, file_content, file.filename, doc_type)
+
         except ValueError as e:
             logger.warning(f"Validation error: {str(e)}")
             raise HTTPException(status_code=400, detail=str(e))
-        except PdfException as e:
+        except PyPdfError as e:
             logger.error(f"PDF processing error: {str(e)}")
             raise HTTPException(status_code=400, detail="Invalid PDF file")
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail="Internal server error")
         finally:
-            # Cleanup if file was created but process failed
-            if 'file_path' in locals() and os.path.exists(file_path) and ('doc' not in locals() or not doc):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
             await file.close()
 
-    def _extract_text(self, file_path: str) -> str:
-        """Extract text from PDF with error handling"""
+    def _process(self, file_content: bytes, filename: str, doc_type: str) -> Dict:
+        # Exact duplicate: skip parsing and storage entirely
+        content_hash = dedup.content_hash(file_content)
+        existing = self.find_exact_duplicate(content_hash)
+        if existing:
+            return self._duplicate_result(existing)
+
+        # Create target directory
+        target_dir = f"data/{doc_type}s/"
+        os.makedirs(target_dir, exist_ok=True)
+
+        # Generate unique filename
+        file_ext = os.path.splitext(filename)[1]
+        unique_filename = f"{uuid.uuid4()}{file_ext}"
+        file_path = os.path.join(target_dir, unique_filename)
+
+        # Save file
+        with open(file_path, "wb") as f:
+            f.write(file_content)
+
+        try:
+            pages = self.extract_pages(file_path)
+            fingerprint = self.fingerprint_pages(pages)
+            doc = self.save_document(
+                title=unique_filename,
+                doc_type=doc_type,
+                file_path=file_path,
+                content_hash=content_hash,
+                fingerprint=fingerprint
+            )
+        except DuplicateDocumentError as e:
+            # Same file uploaded concurrently, the other request stored it first
+            os.remove(file_path)
+            return self._duplicate_result(e.document)
+        except Exception:
+            # Cleanup if file was created but process failed
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            raise
+
+        return {
+            "id": doc.id,
+            "text": " ".join(pages),
+            "path": file_path,
+            "duplicate_of": fingerprint["duplicate_of"],
+            "changed_pages": fingerprint["changed_pages"]
+        }
+
+    @staticmethod
+    def _duplicate_result(existing: Document) -> Dict:
+        logger.info(f"Exact duplicate of {existing.id}, skipping ingestion")
+        return {
+            "id": existing.id,
+            "text": "",
+            "path": existing.file_path,
+            "duplicate_of": existing.id,
+            "changed_pages": []
+        }
+
+    def extract_pages(self, file_path: str) -> List[str]:
+        """Extract per-page text from PDF with error handling.
+
+        Both upload paths use this, so page hashes are always comparable.
+        """
         try:
             with open(file_path, "rb") as f:
                 reader = PdfReader(f)
-                text = " ".join([page.extract_text() or "" for page in reader.pages])
-                if not text.strip():
+                pages = [page.extract_text() or "" for page in reader.pages]
+                if not "".join(pages).strip():
                     raise ValueError("PDF contains no extractable text")
-                return text
+                return pages
         except Exception as e:
             logger.error(f"Text extraction failed: {str(e)}")
             raise ValueError(f"Could not extract text from PDF: {str(e)}")
 
-    def _save_to_db(self, filename: str, doc_type: str, file_path: str, text: str) -> Document:
-        """Save document metadata to database"""
-        try:
-            doc = Document(
-                title=filename,
-                source=doc_type,
-                file_path=file_path,
-                created_at=datetime.now()
+    def find_exact_duplicate(self, content_hash: str, indexed_only: bool = False) -> Optional[Document]:
+        """Look up a stored document with identical file bytes"""
+        with SessionLocal() as db:
+            query = db.query(Document).filter(Document.content_hash == content_hash)
+            if indexed_only:
+                query = query.filter(Document.indexed.is_(True))
+            return query.first()
+
+    def find_near_duplicate(self, signature: List[int], indexed_only: bool = False) -> Optional[Document]:
+        """Return the most similar stored document above the near-duplicate threshold"""
+        buckets = dedup.lsh_buckets(signature)
+        with SessionLocal() as db:
+            candidate_ids = {
+                row.document_id
+                for row in db.query(DocumentMinHashBand.document_id).filter(
+                    or_(*[
+                        and_(DocumentMinHashBand.band == band, DocumentMinHashBand.bucket == bucket)
+                        for band, bucket in enumerate(buckets)
+                    ])
+                )
+            }
+            if not candidate_ids:
+                return None
+
+            candidates = db.query(Document).filter(Document.id.in_(candidate_ids))
+            if indexed_only:
+                candidates = candidates.filter(Document.indexed.is_(True))
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                score = dedup.estimate_jaccard(signature, candidate.minhash or [])
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best_score >= dedup.NEAR_DUPLICATE_THRESHOLD:
+                return best
+            return None
+
+    def fingerprint_pages(self, pages: List[str], indexed_only: bool = False) -> Dict:
+        """
+        Compute dedup signatures for extracted pages and match them against stored documents
+        Args:
+            pages: Per-page text from extract_pages
+            indexed_only: Only match documents whose chunks are in the vector index
+        Returns:
+            dict: {'signature': list[int], 'page_hashes': list[str],
+                   'duplicate_of': UUID | None, 'changed_pages': list[int],
+                   'page_map': dict[int, int]}  # original page -> identical new page
+        """
+        signature = dedup.minhash_signature(" ".join(pages))
+        hashes = dedup.page_hashes(pages)
+        original = self.find_near_duplicate(signature, indexed_only=indexed_only)
+        if original:
+            # Near duplicate: only pages not present in the original are new
+            changed = dedup.changed_pages(hashes, original.page_hashes)
+            page_map = dedup.matched_pages(hashes, original.page_hashes)
+            logger.info(f"Near duplicate of {original.id}, {len(changed)} changed page(s)")
+        else:
+            changed = list(range(len(pages)))
+            page_map = {}
+        return {
+            "signature": signature,
+            "page_hashes": hashes,
+            "duplicate_of": original.id if original else None,
+            "changed_pages": changed,
+            "page_map": page_map
+        }
+
+    def save_document(self, title: str, doc_type: str, file_path: str,
+                      content_hash: str, fingerprint: Dict) -> Document:
+        """
+        Save document metadata and dedup signatures to database
+        Raises:
+            DuplicateDocumentError: If a document with the same content hash already exists
+        """
+        with SessionLocal() as db:
+            try:
+                doc = Document(
+                    title=title,
+                    source=doc_type,
+                    file_path=file_path,
+                    created_at=datetime.now(),
+                    content_hash=content_hash,
+                    minhash=fingerprint["signature"],
+                    page_hashes=fingerprint["page_hashes"],
+                    duplicate_of=fingerprint["duplicate_of"]
+                )
+                db.add(doc)
+                db.flush()
+                db.add_all([
+                    DocumentMinHashBand(document_id=doc.id, band=band, bucket=bucket)
+                    for band, bucket in enumerate(dedup.lsh_buckets(fingerprint["signature"]))
+                ])
+                db.commit()
+                db.refresh(doc)
+                return doc
+            except IntegrityError as e:
+                db.rollback()
+                existing = self.find_exact_duplicate(content_hash)
+                if existing:
+                    raise DuplicateDocumentError(existing)
+                logger.error(f"Database error: {str(e)}")
+                raise ValueError("Failed to save document to database")
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Database error: {str(e)}")
+                raise ValueError("Failed to save document to database")
+
+    def mark_indexed(self, document_id, duplicate_of=None) -> None:
+        """Flag a document as indexed; the original it supersedes no longer is"""
+        with SessionLocal() as db:
+            db.query(Document).filter(Document.id == document_id).update(
+                {"indexed": True, "duplicate_of": duplicate_of}
             )
-            self.db.add(doc)
-            self.db.commit()
-            self.db.refresh(doc)
-            return doc
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Database error: {str(e)}")
-            raise ValueError("Failed to save document to database")
-        finally:
-            self.db.close()
+            if duplicate_of:
+                db.query(Document).filter(Document.id == duplicate_of).update({"indexed": False})
+            db.commit()
 
-    def __del__(self):
-        """Ensure DB connection is closed"""
-        if hasattr(self, 'db'):
-            self.db.close()
\ No newline at end of file
+    def delete_document(self, document_id) -> None:
+        """Remove a document and its LSH bands, e.g. when indexing it failed"""
+        with SessionLocal() as db:
+            db.query(DocumentMinHashBand).filter(DocumentMinHashBand.document_id == document_id).delete()
+            db.query(Document).filter(Document.id == document_id).delete()
+            db.commit()
@@ -0,0 +1,27 @@
+-- Idempotent schema updates, run on every startup by db.session.init_db.
+-- init.sql only runs when the postgres volume is first created, so any
+-- column or table added after that has to be added here as well.
+
+CREATE TABLE IF NOT EXISTS documents (
+    id UUID PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    source VARCHAR(50) NOT NULL,
+    file_path VARCHAR(512) UNIQUE NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+-- Duplicate detection
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS minhash BIGINT[];
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS page_hashes VARCHAR(64)[];
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS duplicate_of UUID REFERENCES documents(id);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS indexed BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash);
+
+CREATE TABLE IF NOT EXISTS document_minhash_bands (
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    band INTEGER NOT NULL,
+    bucket VARCHAR(32) NOT NULL,
+    PRIMARY KEY (document_id, band)
+);
+CREATE INDEX IF NOT EXISTS ix_document_minhash_bands_band_bucket ON document_minhash_bands (band, bucket);
@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, Column, String, DateTime
+from sqlalchemy import create_engine, Column, String, DateTime, Integer, BigInteger, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 import uuid
 
 Base = declarative_base()
@@ -12,4 +12,22 @@ class Document(Base):
     title = Column(String(255), nullable=False)
     source = Column(String(50))  # e.g., "Basel", "RBI", "SEC"
     file_path = Column(String(512), unique=True)
-    created_at = Column(DateTime, nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False)
+    # Duplicate detection
+    content_hash = Column(String(64), unique=True, index=True)  # SHA-256 of the raw PDF
+    minhash = Column(ARRAY(BigInteger))  # MinHash signature of the extracted text
+    page_hashes = Column(ARRAY(String(64)))  # SHA-256 per normalized page
+    duplicate_of = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=True)
+    # True while the document's chunks are in the FAISS index (only the
+    # router's /upload embeds; a near-duplicate supersedes its original)
+    indexed = Column(Boolean, nullable=False, default=False, server_default="false")
+
+class DocumentMinHashBand(Base):
+    """LSH band buckets used to look up near-duplicate candidates"""
+    __tablename__ = "document_minhash_bands"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(String(32), nullable=False)
+
+    __table_args__ = (Index("ix_document_minhash_bands_band_bucket", "band", "bucket"),)
@@ -27,12 +27,24 @@ engine = get_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), "migrations.sql")
+
+def run_migrations():
+    """Apply idempotent schema updates to existing databases"""
+    with open(MIGRATIONS_PATH) as f:
+        sql = f.read()
+    with engine.begin() as conn:
+        # Every worker runs this on startup; serialize them on one lock
+        conn.exec_driver_sql("SELECT pg_advisory_xact_lock(20260001)")
+        conn.exec_driver_sql(sql)
+
 def init_db():
     import time
     max_retries = 5
     for attempt in range(max_retries):
         try:
             Base.metadata.create_all(bind=engine)
+            run_migrations()
             print("Database tables created successfully")
             break
         except Exception as e:
@@ -0,0 +1,43 @@
+# backend/gunicorn_conf.py
+# Runs the API under gunicorn with uvicorn workers. The app and the QA
+# models/index are loaded once in the master, then workers are forked and
+# share that memory copy-on-write instead of each loading a copy.
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+def on_starting(server):
+    # Lets workers find their siblings for the /memory report
+    os.environ["GUNICORN_MASTER_PID"] = str(os.getpid())
+    if os.getenv("PRELOAD_MODELS", "1") == "1":
+        from app.qa_engine import preload
+        preload()
+
+def on_reload(server):
+    # Sent by qa_engine.reload_workers after an index update: load the new
+    # index here so the replacement workers share it instead of each
+    # reloading a private copy
+    if os.getenv("PRELOAD_MODELS", "1") == "1":
+        from app.qa_engine import preload_index
+        preload_index()
+
+def pre_fork(server, worker):
+    # Move preloaded objects out of the GC's reach so collections in the
+    # workers don't write to (and un-share) their pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Importing the app in the master opened a pooled DB connection; drop the
+    # inherited pool (without closing the master's socket) so each worker
+    # opens its own connections
+    from db.session import engine
+    engine.dispose(close=False)
+
+    # Split the cores between workers instead of every worker using all of them
+    import torch
+    torch.set_num_threads(max(1, multiprocessing.cpu_count() // workers))
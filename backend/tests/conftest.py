@@ -0,0 +1,19 @@
+import sys
+import types
+from unittest.mock import MagicMock
+
+# db.session connects to Postgres at import time; tests run without a database
+if "db.session" not in sys.modules:
+    session = types.ModuleType("db.session")
+    session.SessionLocal = MagicMock(name="SessionLocal")
+    session.engine = MagicMock(name="engine")
+    session.init_db = MagicMock(name="init_db")
+    sys.modules["db.session"] = session
+
+# sentence_transformers needs torch; tests that embed swap in a stub model
+try:
+    import sentence_transformers  # noqa: F401
+except ImportError:
+    stub = types.ModuleType("sentence_transformers")
+    stub.SentenceTransformer = MagicMock(name="SentenceTransformer")
+    sys.modules["sentence_transformers"] = stub
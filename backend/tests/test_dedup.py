@@ -0,0 +1,57 @@
+import random
+
+from core import dedup
+
+
+def _words(n, seed=0):
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(n)]
+
+
+def test_content_hash_is_sha256_of_bytes():
+    assert dedup.content_hash(b"abc") == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+def test_minhash_signature_is_stable():
+    text = " ".join(_words(500))
+    signature = dedup.minhash_signature(text)
+    assert len(signature) == dedup.NUM_PERM
+    assert signature == dedup.minhash_signature(text)
+    # Whitespace and case don't change the signature
+    assert signature == dedup.minhash_signature("  " + text.upper().replace(" ", "\n"))
+
+
+def test_estimate_jaccard_near_and_unrelated():
+    words = _words(3000)
+    original = dedup.minhash_signature(" ".join(words))
+    edited = dedup.minhash_signature(" ".join(words[:2950] + _words(50, seed=1)))
+    unrelated = dedup.minhash_signature(" ".join(_words(3000, seed=2)))
+
+    assert dedup.estimate_jaccard(original, original) == 1.0
+    assert dedup.estimate_jaccard(original, edited) >= dedup.NEAR_DUPLICATE_THRESHOLD
+    assert dedup.estimate_jaccard(original, unrelated) < 0.1
+    assert dedup.estimate_jaccard(original, []) == 0.0
+
+
+def test_lsh_buckets_shared_by_near_duplicates():
+    words = _words(3000)
+    original = dedup.lsh_buckets(dedup.minhash_signature(" ".join(words)))
+    edited = dedup.lsh_buckets(dedup.minhash_signature(" ".join(words[:2950])))
+    assert len(original) == dedup.LSH_BANDS
+    assert any(a == b for a, b in zip(original, edited))
+
+
+def test_changed_pages():
+    existing = dedup.page_hashes(["Page one", "Page two"])
+    new = dedup.page_hashes(["page  ONE", "Page two, revised", "Page two"])
+    assert dedup.changed_pages(new, existing) == [1]
+    assert dedup.changed_pages(new, None) == [0, 1, 2]
+
+
+def test_matched_pages_maps_original_to_new():
+    existing = dedup.page_hashes(["a", "b", "c"])
+    new = dedup.page_hashes(["a", "c", "d"])
+    assert dedup.matched_pages(new, existing) == {0: 0, 2: 1}
+    assert dedup.matched_pages(new, None) == {}
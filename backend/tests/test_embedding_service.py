@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core import embedding_service
+from core.embedding_service import EmbeddingService
+
+
+class StubVector(list):
+    def tolist(self):
+        return list(self)
+
+
+class StubModel:
+    """Records every encode call; optionally slow or blocked on an event"""
+
+    def __init__(self, *args, delay=0.0, **kwargs):
+        self.batches = []
+        self.delay = delay
+        self.started = threading.Event()
+        self.release = None
+
+    def eval(self):
+        return self
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        time.sleep(self.delay)
+        return [StubVector([float(len(t))]) for t in texts]
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    def make(delay=0.0, **kwargs):
+        monkeypatch.setattr(embedding_service, "SentenceTransformer", lambda *a, **k: StubModel(delay=delay))
+        return EmbeddingService(**kwargs)
+    return make
+
+
+def _run_threads(targets):
+    threads = [threading.Thread(target=t) for t in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert not any(t.is_alive() for t in threads)
+
+
+def test_concurrent_queries_share_one_forward_pass(make_service):
+    service = make_service(max_batch=32, max_wait_ms=200)
+    barrier = threading.Barrier(5)
+    results = {}
+
+    def query(i):
+        barrier.wait()
+        results[i] = service.embed_query("q" * i)
+
+    _run_threads([lambda i=i: query(i) for i in range(1, 6)])
+
+    assert len(service.model.batches) == 1
+    assert results == {i: [float(i)] for i in range(1, 6)}
+
+
+def test_query_waits_for_at_most_one_bulk_batch(make_service):
+    service = make_service(delay=0.05, max_batch=4, max_wait_ms=1)
+    results = {}
+    bulk = threading.Thread(target=lambda: results.update(bulk=service.embed_documents([f"d{i}" for i in range(40)])))
+    bulk.start()
+    assert service.model.started.wait(5)
+
+    results["query"] = service.embed_query("q")
+    bulk.join(5)
+
+    # The bulk batch already running finishes, then the query goes next
+    assert service.model.batches[1] == ["q"]
+    assert len(results["bulk"]) == 40
+
+
+@pytest.mark.parametrize("parity, backend", [(0.5, "float"), (0.995, "int8")])
+def test_int8_backend_parity_check(make_service, monkeypatch, parity, backend):
+    service = make_service(backend="int8")
+    float_model, quantized = service.model, StubModel()
+    monkeypatch.setattr(service, "_quantize", lambda model: quantized)
+    monkeypatch.setattr(service, "_parity_check", lambda reference, candidate: parity)
+
+    service.embed_query("warm up")
+
+    assert service.parity == parity
+    assert service.backend == backend
+    assert service.model is (quantized if backend == "int8" else float_model)
+
+
+def test_unknown_backend_is_rejected(make_service):
+    with pytest.raises(ValueError):
+        make_service(backend="fp16")
+
+
+def test_cancelled_async_caller_does_not_break_others(make_service):
+    service = make_service(max_batch=8, max_wait_ms=1)
+    service.model.release = threading.Event()
+    # Occupy the batching thread so the next calls queue up behind it
+    blocker = threading.Thread(target=lambda: service.embed_documents(["block"]), daemon=True)
+    blocker.start()
+    assert service.model.started.wait(5)
+
+    results = {}
+
+    async def scenario():
+        cancelled = asyncio.create_task(service.aembed_query("gone"))
+        while len(service._queries) < 1:
+            await asyncio.sleep(0.001)
+        sync_caller = threading.Thread(target=lambda: results.update(sync=service.embed_query("kept")), daemon=True)
+        sync_caller.start()
+        while len(service._queries) < 2:
+            await asyncio.sleep(0.001)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        service.model.release.set()
+        await asyncio.get_running_loop().run_in_executor(None, sync_caller.join, 5)
+        results["async"] = await service.aembed_query("after")
+
+    asyncio.run(scenario())
+    blocker.join(5)
+
+    assert results["sync"] == [4.0]
+    assert results["async"] == [5.0]
+    assert service._worker.is_alive()
+    assert ["gone"] not in service.model.batches
@@ -0,0 +1,115 @@
+import os
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from core import dedup
+from core import pdf_processor as pdf_module
+from core.pdf_processor import DuplicateDocumentError, PDFProcessor
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return PDFProcessor()
+
+
+def _stored_files(tmp_path):
+    return [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_exact_duplicate_short_circuits(processor, tmp_path, monkeypatch):
+    existing = SimpleNamespace(id=uuid.uuid4(), file_path="data/policys/a.pdf")
+    monkeypatch.setattr(processor, "find_exact_duplicate", lambda content_hash: existing)
+    monkeypatch.setattr(processor, "extract_pages", MagicMock())
+
+    result = processor._process(b"%PDF-1.4 same bytes", "circular.pdf", "policy")
+
+    assert result["id"] == existing.id
+    assert result["duplicate_of"] == existing.id
+    assert result["changed_pages"] == []
+    processor.extract_pages.assert_not_called()
+    assert _stored_files(tmp_path) == []
+
+
+def test_near_duplicate_is_linked_with_changed_pages(processor, monkeypatch):
+    original = SimpleNamespace(id=uuid.uuid4(), page_hashes=dedup.page_hashes(["intro", "old terms", "annex"]))
+    saved = SimpleNamespace(id=uuid.uuid4())
+    save_document = MagicMock(return_value=saved)
+    monkeypatch.setattr(processor, "find_exact_duplicate", lambda content_hash: None)
+    monkeypatch.setattr(processor, "extract_pages", lambda path: ["intro", "new terms", "annex"])
+    monkeypatch.setattr(processor, "find_near_duplicate", lambda signature, indexed_only=False: original)
+    monkeypatch.setattr(processor, "save_document", save_document)
+
+    result = processor._process(b"%PDF-1.4 revised", "circular.pdf", "regulation")
+
+    assert result["id"] == saved.id
+    assert result["duplicate_of"] == original.id
+    assert result["changed_pages"] == [1]
+    fingerprint = save_document.call_args.kwargs["fingerprint"]
+    assert fingerprint["duplicate_of"] == original.id
+    assert fingerprint["page_map"] == {0: 0, 2: 2}
+    assert os.path.exists(result["path"])
+
+
+def test_fingerprint_without_match_marks_all_pages_changed(processor, monkeypatch):
+    find_near_duplicate = MagicMock(return_value=None)
+    monkeypatch.setattr(processor, "find_near_duplicate", find_near_duplicate)
+
+    fingerprint = processor.fingerprint_pages(["one", "two"], indexed_only=True)
+
+    assert fingerprint["duplicate_of"] is None
+    assert fingerprint["changed_pages"] == [0, 1]
+    assert fingerprint["page_map"] == {}
+    assert find_near_duplicate.call_args.kwargs["indexed_only"] is True
+
+
+def test_concurrent_insert_returns_existing_document(processor, tmp_path, monkeypatch):
+    existing = SimpleNamespace(id=uuid.uuid4(), file_path="data/policys/first.pdf")
+    session = MagicMock()
+    session.__enter__.return_value = session
+    session.commit.side_effect = IntegrityError("INSERT", {}, Exception("duplicate key content_hash"))
+    monkeypatch.setattr(pdf_module, "SessionLocal", lambda: session)
+    # Not stored yet when this request checks, stored by the time it inserts
+    lookups = iter([None, existing])
+    monkeypatch.setattr(processor, "find_exact_duplicate", lambda content_hash: next(lookups))
+    monkeypatch.setattr(processor, "extract_pages", lambda path: ["page"])
+    monkeypatch.setattr(processor, "find_near_duplicate", lambda signature, indexed_only=False: None)
+
+    result = processor._process(b"%PDF-1.4 raced", "circular.pdf", "policy")
+
+    session.rollback.assert_called_once()
+    assert result["duplicate_of"] == existing.id
+    assert _stored_files(tmp_path) == []
+
+
+def test_integrity_error_without_duplicate_is_a_save_failure(processor, monkeypatch):
+    session = MagicMock()
+    session.__enter__.return_value = session
+    session.commit.side_effect = IntegrityError("INSERT", {}, Exception("duplicate key file_path"))
+    monkeypatch.setattr(pdf_module, "SessionLocal", lambda: session)
+    monkeypatch.setattr(processor, "find_exact_duplicate", lambda content_hash: None)
+
+    fingerprint = {"signature": [1] * dedup.NUM_PERM, "page_hashes": [], "duplicate_of": None}
+    with pytest.raises(ValueError):
+        processor.save_document("t", "policy", "p.pdf", "hash", fingerprint)
+
+
+def test_failed_extraction_removes_saved_file(processor, tmp_path, monkeypatch):
+    monkeypatch.setattr(processor, "find_exact_duplicate", lambda content_hash: None)
+
+    def fail(path):
+        raise ValueError("PDF contains no extractable text")
+    monkeypatch.setattr(processor, "extract_pages", fail)
+
+    with pytest.raises(ValueError):
+        processor._process(b"%PDF-1.4 broken", "circular.pdf", "policy")
+    assert _stored_files(tmp_path) == []
+
+
+def test_duplicate_error_carries_document():
+    doc = SimpleNamespace(id=uuid.uuid4())
+    assert DuplicateDocumentError(doc).document is doc
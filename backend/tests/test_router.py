@@ -0,0 +1,121 @@
+import io
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_community.embeddings.fake import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app import qa_engine, router
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    fake = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(qa_engine, "get_embedding_service", lambda: fake)
+    monkeypatch.setattr(router, "get_embedding_service", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch):
+    path = tmp_path / "vector_store"
+    monkeypatch.setattr(qa_engine, "VECTOR_STORE_PATH", str(path))
+    monkeypatch.setattr(qa_engine, "VECTOR_STORE_INDEX", str(path / "index.faiss"))
+    monkeypatch.setattr(qa_engine, "VECTOR_STORE_DOCSTORE", str(path / "index.pkl"))
+    monkeypatch.setattr(qa_engine, "VECTOR_STORE_LOCK", str(path / ".lock"))
+    return path
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    processor = MagicMock()
+    monkeypatch.setattr(router, "pdf_processor", processor)
+    monkeypatch.setattr(router, "UPLOAD_DIR", str(tmp_path))
+    return processor
+
+
+def _upload(data=b"%PDF-1.4 circular", filename="circular.pdf"):
+    return SimpleNamespace(file=io.BytesIO(data), filename=filename)
+
+
+def _chunks(store):
+    return [store.docstore.search(i) for i in store.index_to_docstore_id.values()]
+
+
+def test_near_duplicate_supersedes_original_chunks(embeddings, vector_store):
+    original, revised = uuid.uuid4(), uuid.uuid4()
+    first = FAISS.from_documents([
+        Document(page_content=text, metadata={"source": "circular.pdf", "page": page, "document_id": str(original)})
+        for page, text in enumerate(["intro", "old terms", "annex"])
+    ], embeddings)
+    qa_engine.update_vectorstore(first, document_id=original, source="circular.pdf")
+
+    changed = FAISS.from_documents([
+        Document(page_content="new terms", metadata={"source": "circular-v2.pdf", "page": 1, "document_id": str(revised)})
+    ], embeddings)
+    qa_engine.update_vectorstore(
+        changed, document_id=revised, source="circular-v2.pdf",
+        supersedes=original, page_map={0: 0, 2: 2}
+    )
+
+    store = FAISS.load_local(str(vector_store), embeddings, allow_dangerous_deserialization=True)
+    chunks = sorted(_chunks(store), key=lambda c: c.metadata["page"])
+    assert [c.page_content for c in chunks] == ["intro", "new terms", "annex"]
+    assert {c.metadata["source"] for c in chunks} == {"circular-v2.pdf"}
+    assert {c.metadata["document_id"] for c in chunks} == {str(revised)}
+    # Filtering on the new source returns unchanged pages too
+    found = store.similarity_search("intro", k=3, filter={"source": "circular-v2.pdf"})
+    assert len(found) == 3
+
+
+def test_indexed_exact_duplicate_short_circuits(processor):
+    processor.find_exact_duplicate.return_value = SimpleNamespace(id=uuid.uuid4(), indexed=True)
+
+    result = router.upload_pdf(_upload())
+
+    assert "already indexed" in result["message"]
+    processor.extract_pages.assert_not_called()
+
+
+def test_unindexed_row_from_main_upload_gets_indexed(processor, monkeypatch):
+    record = SimpleNamespace(id=uuid.uuid4(), indexed=False, file_path="data/policys/x.pdf")
+    processor.find_exact_duplicate.return_value = record
+    processor.extract_pages.return_value = ["page one"]
+    processor.fingerprint_pages.return_value = {
+        "duplicate_of": None, "changed_pages": [0], "page_map": {}
+    }
+    update = MagicMock()
+    monkeypatch.setattr(router, "update_vectorstore", update)
+    monkeypatch.setattr(router.FAISS, "from_documents", MagicMock())
+
+    result = router.upload_pdf(_upload())
+
+    processor.extract_pages.assert_called_once_with(record.file_path)
+    assert processor.fingerprint_pages.call_args.kwargs["indexed_only"] is True
+    processor.save_document.assert_not_called()
+    processor.mark_indexed.assert_called_once_with(record.id, duplicate_of=None)
+    assert result["document_id"] == str(record.id)
+
+
+def test_indexing_failure_deletes_new_record(processor, tmp_path, monkeypatch):
+    record = SimpleNamespace(id=uuid.uuid4(), duplicate_of=None)
+    processor.find_exact_duplicate.return_value = None
+    processor.extract_pages.return_value = ["page one"]
+    processor.fingerprint_pages.return_value = {
+        "duplicate_of": None, "changed_pages": [0], "page_map": {}
+    }
+    processor.save_document.return_value = record
+    monkeypatch.setattr(router.FAISS, "from_documents", MagicMock(side_effect=RuntimeError("embedding failed")))
+
+    with pytest.raises(RuntimeError):
+        router.upload_pdf(_upload())
+
+    processor.delete_document.assert_called_once_with(record.id)
+    processor.mark_indexed.assert_not_called()